@@ -16,47 +16,91 @@
 
 __version__ = "0.0.2"
 
-from . import channel
-from . import ion
-from . import neuron
-from ._base import (
-    HHTypedNeuron,
-    IonChannel,
-    Ion,
-    Channel,
-    MixIons,
-    mix_ions,
-    IonInfo,
-)
-from ._integrator import *
-from ._morphology import (
-    Section,
-    Morphology,
-)
-from ._multi_compartment import (
-    MultiCompartment,
-)
-from ._protocol import (
-    DiffEqState,
-    DiffEqModule,
-)
-from ._single_compartment import (
-    SingleCompartment,
+import importlib as _importlib
+
+# The public API is resolved lazily on first attribute access (PEP 562), so that
+# ``import braincell`` does not pull in ``brainstate``, ``brainunit`` and ``jax``.
+_lazy_submodules = (
+    'channel',
+    'ion',
+    'neuron',
 )
 
-from braincell._misc import deprecation_getattr
-_deprecations = {
-    'SingleCompartment': (
-        f"braincell.neuron.SingleCompartment has been moved "
-        f"into braincell.SingleCompartment",
-        SingleCompartment
-    ),
-    'MultiCompartment': (
-        f"braincell.neuron.MultiCompartment has been moved "
-        f"into braincell.MultiCompartment",
-        MultiCompartment
-    ),
+_lazy_attrs = {
+    # base
+    'HHTypedNeuron': '._base',
+    'IonChannel': '._base',
+    'Ion': '._base',
+    'Channel': '._base',
+    'MixIons': '._base',
+    'mix_ions': '._base',
+    'IonInfo': '._base',
+
+    # morphology
+    'Section': '._morphology',
+    'Morphology': '._morphology',
+
+    # neurons
+    'MultiCompartment': '._multi_compartment',
+    'SingleCompartment': '._single_compartment',
+
+    # protocol
+    'DiffEqState': '._protocol',
+    'DiffEqModule': '._protocol',
+
+    # integrators
+    'get_integrator': '._integrator',
+
+    # exponential Euler
+    'exp_euler_step': '._integrator',
+    'ind_exp_euler_step': '._integrator',
+
+    # runge-kutta methods
+    'euler_step': '._integrator',
+    'midpoint_step': '._integrator',
+    'rk2_step': '._integrator',
+    'heun2_step': '._integrator',
+    'ralston2_step': '._integrator',
+    'rk3_step': '._integrator',
+    'heun3_step': '._integrator',
+    'ssprk3_step': '._integrator',
+    'ralston3_step': '._integrator',
+    'rk4_step': '._integrator',
+    'ralston4_step': '._integrator',
+
+    # diffrax explicit methods
+    'diffrax_euler_step': '._integrator',
+    'diffrax_heun_step': '._integrator',
+    'diffrax_midpoint_step': '._integrator',
+    'diffrax_ralston_step': '._integrator',
+    'diffrax_bosh3_step': '._integrator',
+    'diffrax_tsit5_step': '._integrator',
+    'diffrax_dopri5_step': '._integrator',
+    'diffrax_dopri8_step': '._integrator',
+
+    # diffrax implicit methods
+    'diffrax_bwd_euler_step': '._integrator',
+    'diffrax_kvaerno3_step': '._integrator',
+    'diffrax_kvaerno4_step': '._integrator',
+    'diffrax_kvaerno5_step': '._integrator',
+
+    # staggered
+    'staggered_step': '._integrator',
 }
 
-neuron.__getattr__ = deprecation_getattr(__name__, _deprecations)
-del deprecation_getattr
+__all__ = [*_lazy_submodules, *_lazy_attrs]
+
+
+def __getattr__(name):
+    if name in _lazy_submodules:
+        value = _importlib.import_module(f'.{name}', __name__)
+    elif name in _lazy_attrs:
+        value = getattr(_importlib.import_module(_lazy_attrs[name], __name__), name)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_submodules) | set(_lazy_attrs))
@@ -13,6 +13,7 @@
 # limitations under the License.
 # ==============================================================================
 
+import sys
 import warnings
 from typing import Callable, TYPE_CHECKING
 
@@ -25,14 +26,16 @@ def deprecation_getattr(module, deprecations):
 
     This function generates a custom getattr function for a module, which
     checks if an attribute is deprecated and handles it accordingly by
-    raising an AttributeError or issuing a warning.
+    raising an AttributeError or issuing a warning. Once a deprecated
+    attribute has been resolved, it is cached in the module namespace, so
+    that subsequent accesses are ordinary attribute loads.
 
     Parameters
     ----------
     module : str
         The name of the module for which the custom getattr function is created.
-    deprecations : dict
-        A dictionary where keys are attribute names and values are tuples
+    deprecations : Mapping
+        A mapping where keys are attribute names and values are tuples
         containing a deprecation message and an optional function. If the
         function is None, accessing the attribute will raise an AttributeError.
 
@@ -42,14 +45,17 @@ def deprecation_getattr(module, deprecations):
         A custom getattr function that handles deprecated attributes.
     """
 
-    def getattr(name):
-        if name in deprecations:
-            message, fn = deprecations[name]
-            if fn is None:  # Is the deprecation accelerated?
-                raise AttributeError(message)
-            warnings.warn(message, DeprecationWarning, stacklevel=2)
-            return fn
-        raise AttributeError(f"module {module!r} has no attribute {name!r}")
+    def getattr(name, _deprecations=deprecations, _warn=warnings.warn, _DW=DeprecationWarning):
+        hit = _deprecations.get(name)
+        if hit is None:
+            raise AttributeError(f"module {module!r} has no attribute {name!r}")
+        message, fn = hit
+        if fn is None:  # Is the deprecation accelerated?
+            raise AttributeError(message)
+        _warn(message, _DW, stacklevel=2)
+        if module in sys.modules:
+            vars(sys.modules[module])[name] = fn
+        return fn
 
     return getattr
 
@@ -13,7 +13,6 @@
 # limitations under the License.
 # ==============================================================================
 
-from typing import Union, Callable, Hashable, Tuple, Dict
 from typing import Union, Callable, Hashable, Tuple, Dict
 
 import brainstate
@@ -21,13 +20,11 @@ import brainunit as u
 import jax
 
 Initializer = Union[brainstate.typing.ArrayLike, Callable]
+T = DT = u.Quantity[u.second]
+Y0 = Y1 = Jacobian = jax.Array
+
 SectionName = Hashable
-T = u.Quantity[u.second]
-DT = u.Quantity[u.second]
 VectorFiled = Callable
-Y0 = jax.Array
-Y1 = jax.Array
-Jacobian = jax.Array
 Args = Tuple
 Aux = Dict
 Path = Tuple[str, ...]
@@ -0,0 +1,29 @@
+# Copyright 2025 BDP Ecosystem Limited. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+# -*- coding: utf-8 -*-
+
+import typing
+
+import brainunit as u
+
+import braincell
+from braincell._integrator_runge_kutta import rk4_step
+
+
+def test_type_hints_resolve():
+    hints = typing.get_type_hints(rk4_step)
+    assert hints['target'] is braincell.DiffEqModule
+    assert hints['dt'] == u.Quantity[u.second]
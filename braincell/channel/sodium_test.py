@@ -0,0 +1,211 @@
+# Copyright 2025 BDP Ecosystem Limited. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+# -*- coding: utf-8 -*-
+
+import brainstate
+import brainunit as u
+import jax
+import jax.numpy as jnp
+import numpy as np
+import pytest
+
+import braincell
+
+_RSG_STATES = ['C1', 'C2', 'C3', 'C4', 'C5', 'I1', 'I2', 'I3', 'I4', 'I5', 'O', 'B']
+
+
+def _rsg_with_random_states(V, seed=0, **kwargs):
+    channel = braincell.channel.INa_Rsg(V.shape, **kwargs)
+    channel.init_state(V, None)
+    # a random occupancy of all 13 states, ``I6`` takes the remainder
+    occupancy = np.random.RandomState(seed).dirichlet(np.ones(13), size=V.shape).astype(np.float32)
+    for i, name in enumerate(_RSG_STATES):
+        getattr(channel, name).value = u.math.asarray(occupancy[..., i])
+    return channel
+
+
+def _rsg_values(channel):
+    return np.stack([np.asarray(getattr(channel, name).value) for name in _RSG_STATES], axis=-1)
+
+
+@pytest.mark.parametrize('size', [(5,), (1, 1), (2, 3)])
+def test_rsg_update_state_keeps_shape(size):
+    with brainstate.environ.context(dt=0.025 * u.ms):
+        channel = braincell.channel.INa_Rsg(size)
+        V = u.math.full(size, -20.) * u.mV
+        channel.init_state(V, None)
+        channel.reset_state(V, None)
+        for _ in range(4):
+            channel.update_state(V, None)
+            channel.pre_integral(V, None)
+
+    total = 0.
+    for name in _RSG_STATES:
+        value = getattr(channel, name).value
+        assert value.shape == size
+        assert u.math.all(value >= 0.)
+        total = total + value
+    assert u.math.all(total <= 1. + 1e-5)
+    assert u.math.all(channel.O.value > 0.)
+
+
+def test_rsg_markov_matrix_matches_derivative():
+    # every compartment must use the rates of its own membrane potential
+    V = u.math.linspace(-80., 40., 7) * u.mV
+    channel = _rsg_with_random_states(V)
+    channel.compute_derivative(V, None)
+    derivative = np.stack(
+        [np.asarray(getattr(channel, name).derivative.to_decimal(u.ms ** -1)) for name in _RSG_STATES], axis=-1
+    )
+    A, b = channel._build_A(channel._rates(V), V.shape)
+    expected = np.einsum('...ij,...j->...i', np.asarray(A), _rsg_values(channel)) + np.asarray(b)
+    np.testing.assert_allclose(expected, derivative, rtol=1e-4, atol=1e-4)
+
+
+# backward Euler is first order, the exponential step is exact for the chain
+@pytest.mark.parametrize('markov_solver, atol', [('bwd_euler', 2e-2), ('exp_euler', 1e-3)])
+def test_rsg_update_state_matches_fine_integration(markov_solver, atol):
+    V = u.math.linspace(-80., 40., 7) * u.mV
+    n_step = 20
+    with brainstate.environ.context(dt=0.002 * u.ms):
+        channel = _rsg_with_random_states(V, markov_solver=markov_solver)
+        for _ in range(n_step):
+            channel.update_state(V, None)
+        result = _rsg_values(channel)
+
+    # explicit Euler on ``compute_derivative`` with a much smaller step,
+    # over the same span of ``n_step`` half steps
+    reference = _rsg_with_random_states(V)
+    n_sub = 100
+    h = 0.001 / n_sub * u.ms
+
+    def euler_step(i):
+        reference.compute_derivative(V, None)
+        for name in _RSG_STATES:
+            state = getattr(reference, name)
+            state.value = state.value + h * state.derivative
+
+    brainstate.compile.for_loop(euler_step, np.arange(n_step * n_sub))
+    np.testing.assert_allclose(result, _rsg_values(reference), atol=atol)
+
+
+def test_rsg_unknown_markov_solver():
+    with pytest.raises(ValueError):
+        braincell.channel.INa_Rsg(3, markov_solver='rk4')
+
+
+@pytest.mark.parametrize('cls', [braincell.channel.INa_Ba2002, braincell.channel.INa_TM1991])
+def test_p3q_traub_rates_at_removable_singularities(cls):
+    channel = cls(3)
+    # alpha_p is singular at V - V_sh = 13 mV, beta_p at V - V_sh = 40 mV;
+    # the exact points and the points next to them must give the limits
+    V = channel.V_sh + u.math.asarray([-1e-3, 0., 1e-3]) * u.mV
+    np.testing.assert_allclose(np.asarray(channel.f_p_alpha(V + 13. * u.mV)), 0.32 * 4., rtol=1e-3)
+    np.testing.assert_allclose(np.asarray(channel.f_p_beta(V + 40. * u.mV)), 0.28 * 5., rtol=1e-3)
+
+
+def test_p3q_rate_hooks_can_be_overridden():
+    class INa(braincell.channel.INa_HH1952):
+        def f_p_alpha(self, V):
+            return 3. * super().f_p_alpha(V)
+
+    assert braincell.channel.INa_HH1952._shifted_rates
+    assert not INa._shifted_rates
+
+    V = u.math.linspace(-80., 40., 5) * u.mV
+    base, channel = braincell.channel.INa_HH1952(5), INa(5)
+    for ch in (base, channel):
+        ch.init_state(V, None)
+        ch.reset_state(V, None)
+        ch.compute_derivative(V, None)
+
+    alpha, beta = 3. * base.f_p_alpha(V), base.f_p_beta(V)
+    np.testing.assert_allclose(np.asarray(channel.p.value), np.asarray(alpha / (alpha + beta)), rtol=1e-5)
+    np.testing.assert_allclose(np.asarray(channel.q.value), np.asarray(base.q.value), rtol=1e-5)
+    np.testing.assert_allclose(
+        np.asarray(channel.p.derivative.to_decimal(u.ms ** -1)),
+        np.asarray((alpha * (1. - channel.p.value) - beta * channel.p.value)),
+        rtol=1e-4, atol=1e-6,
+    )
+
+
+def test_rsg_update_state_after_jit():
+    # nothing traced under ``jit`` may leak into a later eager call with the same ``V``
+    V = u.math.linspace(-80., 40., 4) * u.mV
+    with brainstate.environ.context(dt=0.025 * u.ms):
+        channel = braincell.channel.INa_Rsg(4)
+        channel.init_state(V, None)
+        channel.reset_state(V, None)
+        brainstate.compile.jit(lambda: channel.update_state(V, None))()
+        channel.update_state(V, None)
+    assert np.all(np.isfinite(_rsg_values(channel)))
+
+
+def test_rsg_bf16_rates():
+    V = u.math.linspace(-80., 40., 121) * u.mV
+    with brainstate.environ.context(dt=0.025 * u.ms):
+        channel = _rsg_with_random_states(V)
+        rates = channel._rates(V)
+        with brainstate.environ.context(precision='bf16'):
+            rates_bf16 = channel._rates(V)
+            channel.update_state(V, None)
+    for name in rates._fields:
+        value = u.get_mantissa(getattr(rates_bf16, name))
+        assert value.dtype == jnp.float32
+        # ``V`` itself is rounded to ``bfloat16``, a quarter of a mV around -80 mV
+        np.testing.assert_allclose(value, u.get_mantissa(getattr(rates, name)), rtol=1.5e-2, err_msg=name)
+    for name in _RSG_STATES:
+        assert getattr(channel, name).value.dtype == jnp.float32
+    assert np.all(np.isfinite(_rsg_values(channel)))
+
+
+def test_rsg_step_pure_in_scan():
+    V = u.math.linspace(-80., 40., 4) * u.mV
+    channel = _rsg_with_random_states(V)
+    S0 = tuple(getattr(channel, name).value for name in _RSG_STATES)
+    attributes = dict(vars(channel))
+
+    def loss(v):
+        def step(S, _):
+            return channel._step_pure(v * u.mV, S, 0.0125), None
+
+        S, _ = jax.lax.scan(step, S0, None, length=10)
+        return S[_RSG_STATES.index('O')].sum()
+
+    grad = jax.grad(loss)(u.math.full(4, -20.))
+    assert np.all(np.isfinite(np.asarray(grad)))
+
+    # the step neither writes nor replaces anything on the channel
+    assert vars(channel).keys() == attributes.keys()
+    assert all(vars(channel)[key] is value for key, value in attributes.items())
+    assert not any(isinstance(value, jax.core.Tracer) for value in vars(channel).values())
+    for name, value in zip(_RSG_STATES, S0):
+        assert getattr(channel, name).value is value
+
+
+@pytest.mark.parametrize('markov_solver', ['bwd_euler', 'exp_euler'])
+def test_rsg_update_state_with_traced_dt(markov_solver):
+    V = u.math.linspace(-80., 40., 4) * u.mV
+
+    def run(dt):
+        with brainstate.environ.context(dt=dt * u.ms):
+            channel.update_state(V, None)
+        return channel.O.value
+
+    channel = _rsg_with_random_states(V, markov_solver=markov_solver)
+    traced = brainstate.compile.jit(run)(0.025)
+    channel = _rsg_with_random_states(V, markov_solver=markov_solver)
+    np.testing.assert_allclose(np.asarray(traced), np.asarray(run(0.025)), rtol=1e-5, atol=1e-7)
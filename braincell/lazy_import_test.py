@@ -0,0 +1,60 @@
+# Copyright 2025 BDP Ecosystem Limited. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+# -*- coding: utf-8 -*-
+
+import subprocess
+import sys
+import textwrap
+
+import braincell
+
+
+def _run(code):
+    # a fresh interpreter, since the test session has already imported jax
+    subprocess.run([sys.executable, '-c', textwrap.dedent(code)], check=True)
+
+
+def test_import_is_lazy():
+    _run(
+        """
+        import sys
+        import braincell
+        assert 'jax' not in sys.modules
+        assert 'brainstate' not in sys.modules
+        assert braincell.Section.__name__ == 'Section'
+        assert 'jax' in sys.modules
+        """
+    )
+
+
+def test_star_import():
+    _run(
+        """
+        import braincell
+        namespace = {}
+        exec('from braincell import *', namespace)
+        assert 'importlib' not in namespace
+        for name in ('channel', 'ion', 'neuron', 'Section', 'MultiCompartment', 'DiffEqState', 'staggered_step'):
+            assert namespace[name] is getattr(braincell, name)
+        """
+    )
+
+
+def test_lazy_integrators_match_integrator_all():
+    from braincell import _integrator
+
+    lazy = {name for name, module in braincell._lazy_attrs.items() if module == '._integrator'}
+    assert lazy == set(_integrator.__all__)
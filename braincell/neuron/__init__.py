@@ -13,5 +13,31 @@
 # limitations under the License.
 # ==============================================================================
 
+import sys
+from types import MappingProxyType
+
+from braincell._misc import deprecation_getattr
+from braincell._multi_compartment import MultiCompartment
+from braincell._single_compartment import SingleCompartment
 
 __all__ = []
+
+_deprecations = MappingProxyType({
+    'SingleCompartment': (
+        sys.intern(
+            f"braincell.neuron.SingleCompartment has been moved "
+            f"into braincell.SingleCompartment"
+        ),
+        SingleCompartment
+    ),
+    'MultiCompartment': (
+        sys.intern(
+            f"braincell.neuron.MultiCompartment has been moved "
+            f"into braincell.MultiCompartment"
+        ),
+        MultiCompartment
+    ),
+})
+
+__getattr__ = deprecation_getattr(__name__, _deprecations)
+del deprecation_getattr, MultiCompartment, SingleCompartment, _deprecations